@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+import pyarrow as pa
+from config import CHECKPOINT_CONFIG
+from state_utils import schema_fingerprint, write_json_atomic
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def dataframe_fingerprint(df):
+    """Calcule une empreinte de contenu (colonnes, types et valeurs) d'un DataFrame"""
+    empreinte = hashlib.sha256()
+    empreinte.update(schema_fingerprint(df).encode("utf-8"))
+    empreinte.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return empreinte.hexdigest()
+
+
+def _checkpoint_path(manifest, name):
+    return os.path.join(manifest['directory'], f"{name}.arrow")
+
+
+def _save_manifest(manifest):
+    """Écrit le manifeste de façon atomique"""
+    write_json_atomic(os.path.join(manifest['directory'], MANIFEST_FILE), manifest)
+
+
+def init_checkpoints(resume=False, directory=None):
+    """
+    Prépare le répertoire des checkpoints et retourne le manifeste du run.
+    Sans reprise, les checkpoints du run précédent sont supprimés.
+    """
+    directory = directory or CHECKPOINT_CONFIG['directory']
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+
+    if resume and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        manifest['directory'] = directory
+        print(f"♻️ Reprise depuis les checkpoints de '{directory}'")
+        return manifest
+
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    manifest = {'directory': directory, 'stages': {}, 'published': {}}
+    _save_manifest(manifest)
+    return manifest
+
+
+def write_checkpoint(manifest, name, df):
+    """
+    Écrit un DataFrame au format Arrow IPC (Feather v2, non compressé
+    pour permettre le memory-mapping) et retourne son empreinte.
+    """
+    fingerprint = dataframe_fingerprint(df)
+    table = pa.Table.from_pandas(df)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"fingerprint"] = fingerprint.encode("utf-8")
+    table = table.replace_schema_metadata(metadata)
+
+    path = _checkpoint_path(manifest, name)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return fingerprint
+
+
+def read_checkpoint(manifest, name):
+    """Relit un checkpoint en memory-map (sans copie des buffers Arrow)"""
+    source = pa.memory_map(_checkpoint_path(manifest, name), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _checkpoint_fingerprint(manifest, name):
+    """Lit l'empreinte stockée dans le schéma du checkpoint (pied de fichier uniquement)"""
+    path = _checkpoint_path(manifest, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except pa.ArrowInvalid:
+        return None
+    fingerprint = metadata.get(b"fingerprint")
+    return fingerprint.decode("utf-8") if fingerprint else None
+
+
+def stage_complete(manifest, stage):
+    """Indique si toutes les sorties d'une étape sont présentes et intègres"""
+    stage_info = manifest['stages'].get(stage)
+    if stage_info is None:
+        return False
+    return all(
+        _checkpoint_fingerprint(manifest, name) == fingerprint
+        for name, fingerprint in stage_info['outputs'].items()
+    )
+
+
+def save_stage(manifest, stage, outputs):
+    """Écrit les sorties d'une étape puis la marque comme terminée"""
+    stage_outputs = {}
+    for name, df in outputs.items():
+        stage_outputs[name] = write_checkpoint(manifest, name, df)
+    manifest['stages'][stage] = {'outputs': stage_outputs}
+    _save_manifest(manifest)
+
+
+def invalidate_stage(manifest, stage):
+    """Retire une étape du manifeste (elle sera recalculée)"""
+    if manifest['stages'].pop(stage, None) is not None:
+        _save_manifest(manifest)
+
+
+def output_fingerprint(manifest, name):
+    """Retourne l'empreinte enregistrée pour une sortie d'étape"""
+    for stage_info in manifest['stages'].values():
+        if name in stage_info['outputs']:
+            return stage_info['outputs'][name]
+    return None
+
+
+def is_published(manifest, table_name, fingerprint):
+    """Indique si la table a déjà été publiée avec ce contenu pendant le run"""
+    return fingerprint is not None and manifest['published'].get(table_name) == fingerprint
+
+
+def mark_published(manifest, table_name, fingerprint):
+    """Enregistre la publication d'une table dans le manifeste"""
+    manifest['published'][table_name] = fingerprint
+    _save_manifest(manifest)
@@ -76,3 +76,13 @@ DATA_FILES = {
     'objectif_tmc': 'Objectif_tmc_2020_2024.xlsx',
     'structures': 'Structures.xlsx'
 }
+
+# Répertoire des checkpoints (reprise du pipeline après échec)
+CHECKPOINT_CONFIG = {
+    'directory': get_data_file_path('checkpoints')
+}
+
+# État des dernières publications Nessie (empreintes par table / partition)
+PUBLISH_STATE_CONFIG = {
+    'path': get_data_file_path('publish_state.json')
+}
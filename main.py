@@ -7,10 +7,15 @@ import math
 from trino.dbapi import connect
 from datetime import date
 import os
+import argparse
 
 # Imports des modules personnalisés
 from config import TRINO_CONFIG, TRINO_CATALOGS, DATA_FILES
 from nessie_utils import push_df_to_nessie
+from checkpoint_utils import (
+    init_checkpoints, stage_complete, save_stage, invalidate_stage,
+    read_checkpoint, output_fingerprint, is_published, mark_published
+)
 
 
 def create_trino_connections():
@@ -471,56 +476,123 @@ def merge_with_structures(join_df, struct):
     return join_data
 
 
-def main():
-    """Fonction principale"""
-    print("Début du traitement des données...")
-    
-    # 1. Création des connexions Trino
+def extract_stage():
+    """Étape d'extraction : ouvre les connexions Trino le temps des requêtes"""
     print("Création des connexions Trino...")
     connections = create_trino_connections()
-    
-    # 2. Extraction des données
-    print("Extraction des données...")
-    q_tcel_hta, q_inci_htb, q_man_htb_hta = extract_data(connections)
-    
-    # 3. Traitement des données d'énergie
-    print("Traitement des données d'énergie...")
-    df_el, df_el_tcel = process_energie_data( q_tcel_hta)
-    df_power = process_power_calculations(df_el)
-    
-    # 4. Traitement des incidents et manœuvres
-    print("Traitement des incidents et manœuvres...")
-    df_inci_filtre, df_inci_htb = process_incidents_data(q_inci_htb)
-    df_man_filtre, df_man_htb = process_maneuvers_data(q_man_htb_hta)
-    df_inci_man = process_combined_data(df_inci_filtre, df_man_filtre)
-    
-    # 5. Chargement et fusion des données d'objectifs
-    print("Chargement des objectifs TMC...")
-    obj_tmc = load_objectives_data()
-    inci_man_obj = merge_with_objectives(df_inci_man, obj_tmc)
-    
-    # 6. Fusion avec les données d'énergie
-    print("Fusion avec les données d'énergie...")
-    join_df = merge_with_energy_data(inci_man_obj, df_power)
-    
-    # 7. Chargement et fusion des structures
-    print("Chargement des structures...")
-    struct = load_structures_data()
-    join_data = merge_with_structures(join_df, struct)
-    
-    # 8. Envoi vers Nessie
+    try:
+        return extract_data(connections)
+    finally:
+        for conn in connections.values():
+            conn.close()
+
+
+# Étapes du pipeline : (nom, fonction, entrées, sorties)
+# Chaque sortie est checkpointée pour permettre la reprise après échec.
+PIPELINE_STAGES = [
+    ("extraction", extract_stage, [],
+     ["q_tcel_hta", "q_inci_htb", "q_man_htb_hta"]),
+    ("energie", process_energie_data, ["q_tcel_hta"],
+     ["df_el", "df_el_tcel"]),
+    ("puissance", process_power_calculations, ["df_el"],
+     ["df_power"]),
+    ("incidents", process_incidents_data, ["q_inci_htb"],
+     ["df_inci_filtre", "df_inci_htb"]),
+    ("manoeuvres", process_maneuvers_data, ["q_man_htb_hta"],
+     ["df_man_filtre", "df_man_htb"]),
+    ("combinaison", process_combined_data, ["df_inci_filtre", "df_man_filtre"],
+     ["df_inci_man"]),
+    ("objectifs", lambda df_inci_man: merge_with_objectives(df_inci_man, load_objectives_data()),
+     ["df_inci_man"], ["inci_man_obj"]),
+    ("fusion_energie", merge_with_energy_data, ["inci_man_obj", "df_power"],
+     ["join_df"]),
+    ("structures", lambda join_df: merge_with_structures(join_df, load_structures_data()),
+     ["join_df"], ["join_data"]),
+]
+
+# Tables publiées vers Nessie : (sortie, table Postgres, table Trino, colonne de partition)
+# Avec une colonne de partition, seuls les mois modifiés sont republiés.
+PUBLICATIONS = [
+    ("join_data", "temp_df_data", "data", None),
+    ("df_man_htb", "temp_df_db_man_htb_hta_2", "db_man_htb_hta_2", "date_heure_debut"),
+    ("df_inci_htb", "temp_df_db_inci_htb", "db_inci_htb", "date_heure_debut"),
+    ("df_el_tcel", "temp_df_db_tcel_hta", "db_tcel_hta", "date_mois"),
+]
+
+
+def run_pipeline(checkpoints):
+    """
+    Exécute les étapes à partir de la première étape incomplète.
+    Les entrées produites par les étapes déjà terminées sont relues
+    depuis leurs checkpoints.
+    """
+    first_stage = next(
+        (i for i, (stage, _, _, _) in enumerate(PIPELINE_STAGES)
+         if not stage_complete(checkpoints, stage)),
+        len(PIPELINE_STAGES)
+    )
+
+    # Les étapes suivantes dépendent de données recalculées : on les invalide
+    for stage, _, _, _ in PIPELINE_STAGES[first_stage:]:
+        invalidate_stage(checkpoints, stage)
+
+    data = {}
+    for stage, func, inputs, outputs in PIPELINE_STAGES[first_stage:]:
+        for name in inputs:
+            if name not in data:
+                data[name] = read_checkpoint(checkpoints, name)
+
+        print(f"Étape '{stage}'...")
+        result = func(*(data[name] for name in inputs))
+        if len(outputs) == 1:
+            result = (result,)
+
+        stage_outputs = dict(zip(outputs, result))
+        save_stage(checkpoints, stage, stage_outputs)
+        data.update(stage_outputs)
+
+    if first_stage == len(PIPELINE_STAGES):
+        print("Toutes les étapes sont déjà terminées, reprise à la publication")
+    else:
+        print(f"Étapes exécutées à partir de '{PIPELINE_STAGES[first_stage][0]}'")
+
+    return data
+
+
+def publish_outputs(checkpoints, data):
+    """Envoie les tables vers Nessie en sautant celles déjà publiées dans le run"""
+    for name, pg_table_name, trino_table_name, partition_column in PUBLICATIONS:
+        fingerprint = output_fingerprint(checkpoints, name)
+        if is_published(checkpoints, trino_table_name, fingerprint):
+            print(f"⏭️ Table '{trino_table_name}' déjà publiée dans ce run")
+            continue
+
+        df = data[name] if name in data else read_checkpoint(checkpoints, name)
+        push_df_to_nessie(df=df, pg_table_name=pg_table_name, trino_table_name=trino_table_name,
+                          partition_column=partition_column)
+        mark_published(checkpoints, trino_table_name, fingerprint)
+
+
+def main(resume=False):
+    """Fonction principale"""
+    print("Début du traitement des données...")
+
+    # 1. Initialisation des checkpoints (reprise ou nouveau run)
+    checkpoints = init_checkpoints(resume=resume)
+
+    # 2. Extraction et traitements
+    data = run_pipeline(checkpoints)
+
+    # 3. Envoi vers Nessie
     print("Envoi des données vers Nessie...")
-    push_df_to_nessie(df=join_data, pg_table_name="temp_df_data", trino_table_name="data")
-    push_df_to_nessie(df=df_man_htb, pg_table_name="temp_df_db_man_htb_hta_2", trino_table_name="db_man_htb_hta_2")
-    push_df_to_nessie(df=df_inci_htb, pg_table_name="temp_df_db_inci_htb", trino_table_name="db_inci_htb")
-    push_df_to_nessie(df=df_el_tcel, pg_table_name="temp_df_db_tcel_hta", trino_table_name="db_tcel_hta")
-    
+    publish_outputs(checkpoints, data)
+
     print("✅ Traitement terminé avec succès!")
-    
-    # Fermeture des connexions
-    for conn in connections.values():
-        conn.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline TMC vers Nessie")
+    parser.add_argument("--resume", action="store_true",
+                        help="reprendre à la première étape incomplète du dernier run")
+    args = parser.parse_args()
+    main(resume=args.resume)
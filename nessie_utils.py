@@ -1,16 +1,88 @@
+import os
+import json
+import numpy as np
+import pandas as pd
 import sqlalchemy as sa
 from urllib.parse import quote_plus
-from config import POSTGRES_CONFIG, NESSIE_CONFIG
+from config import POSTGRES_CONFIG, NESSIE_CONFIG, PUBLISH_STATE_CONFIG
+from state_utils import schema_fingerprint, write_json_atomic
+
+
+NULL_PARTITION = "null"
+
+
+def _row_hash_fingerprint(hashes):
+    """
+    Empreinte indépendante de l'ordre des lignes : somme des hash 64 bits
+    découpés en deux moitiés 32 bits (pas de débordement) + nombre de lignes.
+    """
+    high = int((hashes >> np.uint64(32)).sum())
+    low = int((hashes & np.uint64(0xFFFFFFFF)).sum())
+    return f"{high:x}-{low:x}-{len(hashes)}"
+
+
+def row_hashes(df):
+    """Hash 64 bits de chaque ligne (calculé une seule fois par publication)"""
+    return pd.util.hash_pandas_object(df, index=False).values
+
+
+def partition_keys(df, partition_column):
+    """Clé de partition 'AAAA-MM' dérivée d'une colonne date"""
+    dates = pd.to_datetime(df[partition_column], errors='coerce')
+    return dates.dt.strftime('%Y-%m').fillna(NULL_PARTITION)
+
+
+def partition_fingerprints(hashes, keys):
+    """Empreintes par partition annee/mois, indépendantes de l'ordre des lignes"""
+    return {
+        key: _row_hash_fingerprint(partition_hashes.values)
+        for key, partition_hashes in pd.Series(hashes).groupby(keys.values)
+    }
+
+
+def load_publish_state(state_path=None):
+    """Charge l'état des dernières publications réussies"""
+    state_path = state_path or PUBLISH_STATE_CONFIG['path']
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_publish_state(state, state_path=None):
+    """Écrit l'état des publications de façon atomique"""
+    state_path = state_path or PUBLISH_STATE_CONFIG['path']
+    write_json_atomic(state_path, state)
+
+
+def _partition_predicate(partition_column, partitions):
+    """Prédicat Trino sélectionnant les partitions annee/mois données"""
+    conditions = []
+    months = sorted(p for p in partitions if p != NULL_PARTITION)
+    if months:
+        values = ", ".join(f"'{month}'" for month in months)
+        conditions.append(
+            f"""date_format(CAST("{partition_column}" AS timestamp), '%Y-%m') IN ({values})"""
+        )
+    if NULL_PARTITION in partitions:
+        conditions.append(f'"{partition_column}" IS NULL')
+    return " OR ".join(conditions)
 
 
 def push_df_to_nessie(df, pg_table_name, trino_table_name,
                       pg_user=None, pg_password=None,
                       pg_host=None, pg_port=None, pg_db=None,
                       trino_user=None, trino_host=None, trino_port=None,
-                      trino_catalog=None, trino_schema=None):
+                      trino_catalog=None, trino_schema=None,
+                      partition_column=None, skip_unchanged=True,
+                      state_path=None):
     """
     Envoie un DataFrame vers Postgres via SQLAlchemy/psycopg2
     puis crée une table CETAS dans Trino/Nessie.
+
+    L'empreinte du contenu est comparée à celle de la dernière publication
+    réussie : une table inchangée n'est pas republiée. Avec `partition_column`,
+    seules les partitions annee/mois modifiées sont rechargées (DELETE + INSERT).
     """
 
     # Valeurs par défaut depuis la config
@@ -26,6 +98,45 @@ def push_df_to_nessie(df, pg_table_name, trino_table_name,
     trino_catalog = trino_catalog or NESSIE_CONFIG['trino_catalog']
     trino_schema  = trino_schema  or NESSIE_CONFIG['trino_schema']
 
+    target_table = f'"{trino_catalog}"."{trino_schema}"."{trino_table_name}"'
+
+    # ==================================================
+    # 0. Détection des changements par empreinte
+    # ==================================================
+    state = load_publish_state(state_path)
+    previous = state.get(target_table)
+
+    hashes = row_hashes(df)
+    current = {
+        'schema': schema_fingerprint(df),
+        'fingerprint': _row_hash_fingerprint(hashes),
+        'partition_column': partition_column,
+    }
+    if partition_column is not None:
+        keys = partition_keys(df, partition_column)
+        current['partitions'] = partition_fingerprints(hashes, keys)
+
+    if skip_unchanged and previous is not None \
+            and previous['schema'] == current['schema'] \
+            and previous['fingerprint'] == current['fingerprint']:
+        print(f"⏭️ Table '{trino_table_name}' inchangée depuis la dernière publication")
+        return
+
+    changed_partitions = None
+    if skip_unchanged and partition_column is not None and previous is not None \
+            and previous['schema'] == current['schema'] \
+            and previous.get('partition_column') == partition_column:
+        old_partitions = previous.get('partitions', {})
+        new_partitions = current['partitions']
+        changed_partitions = {
+            key for key, fingerprint in new_partitions.items()
+            if old_partitions.get(key) != fingerprint
+        } | (old_partitions.keys() - new_partitions.keys())
+
+        df = df[keys.isin(changed_partitions).values]
+        print(f"🔁 Table '{trino_table_name}' : {len(changed_partitions)} partition(s) modifiée(s) "
+              f"sur {len(new_partitions)} : {', '.join(sorted(changed_partitions))}")
+
     # ==================================================
     # 1. Écriture dans Postgres via SQLAlchemy + psycopg2
     # ==================================================
@@ -54,26 +165,46 @@ def push_df_to_nessie(df, pg_table_name, trino_table_name,
 
     # ==================================================
     # 2. Création de la table CETAS dans Trino/Nessie
+    #    (ou remplacement des seules partitions modifiées)
     # ==================================================
     trino_engine = sa.create_engine(
         f"trino://{trino_user}@{trino_host}:{trino_port}?auth=none"
     )
 
-    cetas_query = f"""
-    CREATE OR REPLACE TABLE "{trino_catalog}"."{trino_schema}"."{trino_table_name}" AS
-    SELECT * FROM "{pg_db}".public.{pg_table_name}
-    """
+    if changed_partitions is None:
+        queries = [f"""
+        CREATE OR REPLACE TABLE {target_table} AS
+        SELECT * FROM "{pg_db}".public.{pg_table_name}
+        """]
+    else:
+        queries = [
+            f"DELETE FROM {target_table} WHERE {_partition_predicate(partition_column, changed_partitions)}",
+            f'INSERT INTO {target_table} SELECT * FROM "{pg_db}".public.{pg_table_name}',
+        ]
+
+        # Le DELETE et l'INSERT sont deux commits distincts : on oublie l'état
+        # avant de commencer pour qu'un échec entre les deux force un CETAS complet
+        del state[target_table]
+        save_publish_state(state, state_path)
 
     try:
         with trino_engine.connect() as conn:
-            conn.execute(sa.text(cetas_query))
-        print(f"✅ Table '{trino_table_name}' créée dans Nessie via CETAS")
+            for query in queries:
+                conn.execute(sa.text(query))
+        if changed_partitions is None:
+            print(f"✅ Table '{trino_table_name}' créée dans Nessie via CETAS")
+        else:
+            print(f"✅ Partitions de '{trino_table_name}' mises à jour dans Nessie")
     except Exception as e:
         print(f"❌ Erreur lors de la création Trino/Nessie : {e}")
         raise
     finally:
         trino_engine.dispose()
 
+    # Mémorisation de l'empreinte de la publication réussie
+    state[target_table] = current
+    save_publish_state(state, state_path)
+
     # Vérification : affiche les 5 premières lignes
     trino_engine = sa.create_engine(
         f"trino://{trino_user}@{trino_host}:{trino_port}?auth=none"
@@ -81,7 +212,7 @@ def push_df_to_nessie(df, pg_table_name, trino_table_name,
     try:
         with trino_engine.connect() as conn:
             result = conn.execute(
-                sa.text(f'SELECT * FROM "{trino_catalog}"."{trino_schema}"."{trino_table_name}" LIMIT 5')
+                sa.text(f'SELECT * FROM {target_table} LIMIT 5')
             )
             print("✅ Premières lignes de la table CETAS :")
             for row in result:
@@ -0,0 +1,15 @@
+import os
+import json
+
+
+def schema_fingerprint(df):
+    """Empreinte des colonnes et de leurs types"""
+    return json.dumps([[str(col), str(dtype)] for col, dtype in df.dtypes.items()])
+
+
+def write_json_atomic(path, data):
+    """Écrit un fichier JSON de façon atomique (fichier temporaire + remplacement)"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)